@@ -0,0 +1,11 @@
+"""Startpunkt för ``python -m app``.
+
+Servern startas härifrån i stället för från app.main: arbetarprocesserna i PDF-poolen
+importerar då inte om app.main (med RAG-lager och HTTP-klienter) som huvudmodul.
+"""
+
+import uvicorn
+
+from .main import APP_HOST, APP_PORT
+
+uvicorn.run("app.main:app", host=APP_HOST, port=APP_PORT, reload=False)
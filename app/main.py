@@ -1,29 +1,44 @@
+import asyncio
+import hashlib
 import io
+import ipaddress
 import os
 import json
+import logging
+import multiprocessing
+import re
+import shutil
 import socket
-import tempfile
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 from functools import lru_cache
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import httpx
-import pyttsx3
-from bs4 import BeautifulSoup
+import numpy as np
+import orjson
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request, HTTPException, UploadFile, File
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from pydub import AudioSegment
-from pypdf import PdfReader
-from faster_whisper import WhisperModel
+from selectolax.lexbor import LexborHTMLParser
+from starlette.types import ASGIApp, Receive, Scope, Send
 
+from .pdf_worker import extract_pdf_page_range, extract_small_pdf
 from .rag_store import RAGResult, RAGStore
+from .semantic_cache import SemanticCache
 
 from urllib.parse import urlparse
 
+# Tunga beroenden (Whisper/CTranslate2, PDFium, libsndfile) importeras först där de
+# används, så att appen startar snabbt och chatt-only-användning aldrig laddar dem
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434").rstrip("/")
 DEFAULT_MODEL = os.getenv("LLM_MODEL", "llama3.2:1b")
 APP_HOST = os.getenv("APP_HOST", "0.0.0.0")
@@ -35,9 +50,86 @@ RAG_STORE_PATH = os.path.abspath(os.path.expanduser(os.getenv("RAG_STORE_PATH",
 MAX_IMPORTED_CHARS = 40_000
 MAX_PDF_BYTES = 8 * 1024 * 1024  # 8 MB
 MAX_PDF_PAGES = 40
+MAX_AUDIO_BYTES = 25 * 1024 * 1024  # 25 MB
+# All PDFium-kod körs i en processpool: PDFium är inte trådsäkert och
+# extraheringen får inte blockera event-loopen. Varje arbetare håller en
+# egen kopia av PDF-datan, så antalet begränsas.
+PDF_WORKERS = max(1, min(os.cpu_count() or 1, 4))
+PDF_PARALLEL_MIN_PAGES = 8
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Marginal för multipart-huvuden när Content-Length jämförs mot filgränsen
+UPLOAD_OVERHEAD_BYTES = 64 * 1024
+PDF_TOO_LARGE_DETAIL = "PDF-filen är för stor. Max 8 MB stöds."
+AUDIO_TOO_LARGE_DETAIL = "Ljudfilen är för stor. Max 25 MB stöds."
+
+# Semantisk cache för chattsvar utan RAG: en nästan likadan fråga i samma konversation
+# besvaras direkt i stället för att LLM:en genererar svaret på nytt. Avstängd som standard,
+# eftersom varje fråga då först går till embeddings-modellen och frågor som bara skiljer
+# sig i ett tal eller namn kan få samma svar
+CHAT_CACHE_ENABLED = os.getenv("CHAT_CACHE", "0").strip().lower() in {"1", "true", "yes", "on"}
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", "3600"))
+CHAT_CACHE_THRESHOLD = float(os.getenv("CHAT_CACHE_THRESHOLD", "0.95"))
+
+# Sök i kunskapsbasen med int8-kvantiserade vektorer (kräver simsimd); 0 ger exakt float32
+RAG_INT8 = os.getenv("RAG_INT8", "1").strip().lower() not in {"0", "false", "no", "off"}
+
+# orjson serialiserar direkt till bytes och är betydligt snabbare än json-modulen
+app = FastAPI(title="Raspi Ollama WebUI (sv)", default_response_class=ORJSONResponse)
+rag_store = RAGStore(OLLAMA_HOST, EMBED_MODEL, RAG_STORE_PATH, quantize=RAG_INT8)
+chat_cache = SemanticCache(ttl=CHAT_CACHE_TTL, threshold=CHAT_CACHE_THRESHOLD)
+
+# Delade klienter så att anslutningar återanvänds mellan anrop
+ollama_client = httpx.AsyncClient(
+    base_url=OLLAMA_HOST,
+    timeout=300,
+    limits=httpx.Limits(max_keepalive_connections=32),
+)
+# HTTP/2 bara mot webbsidor: det förhandlas via TLS (ALPN), och Ollama talar
+# okrypterad HTTP/1.1 där keep-alive-poolen ovan räcker
+web_client = httpx.AsyncClient(
+    timeout=60,
+    follow_redirects=True,
+    http2=True,
+    headers={"User-Agent": "Ollama-WebUI/1.0"},
+)
+
+
+@app.on_event("shutdown")
+async def _close_http_clients() -> None:
+    await ollama_client.aclose()
+    await web_client.aclose()
+    await rag_store.aclose()
+
+
+# Sökväg -> (max antal byte i uppladdad fil, felmeddelande)
+_UPLOAD_LIMITS = {
+    "/api/rag/docs/pdf": (MAX_PDF_BYTES, PDF_TOO_LARGE_DETAIL),
+    "/api/transcribe": (MAX_AUDIO_BYTES, AUDIO_TOO_LARGE_DETAIL),
+}
+
+
+class _RejectOversizedUploads:
+    # Avvisa för stora uppladdningar på deklarerad storlek innan kroppen läses in.
+    # Ren ASGI-middleware: övriga anrop (t.ex. strömmad chatt) skickas vidare orörda.
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        limit = _UPLOAD_LIMITS.get(scope.get("path", "")) if scope["type"] == "http" else None
+        if limit is not None and scope.get("method") == "POST":
+            max_bytes, detail = limit
+            content_length = next(
+                (value.decode("latin-1") for name, value in scope.get("headers", []) if name == b"content-length"),
+                "",
+            )
+            if content_length.isdigit() and int(content_length) > max_bytes + UPLOAD_OVERHEAD_BYTES:
+                response = ORJSONResponse({"detail": detail}, status_code=413)
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
 
-app = FastAPI(title="Raspi Ollama WebUI (sv)")
-rag_store = RAGStore(OLLAMA_HOST, EMBED_MODEL, RAG_STORE_PATH)
+
+app.add_middleware(_RejectOversizedUploads)
 
 
 def _normalize_document_text(text: str, limit: int = MAX_IMPORTED_CHARS) -> Tuple[str, bool]:
@@ -49,74 +141,146 @@ def _normalize_document_text(text: str, limit: int = MAX_IMPORTED_CHARS) -> Tupl
     return cleaned, truncated
 
 
-def _html_to_text_and_title(html: str) -> Tuple[str, Optional[str]]:
-    soup = BeautifulSoup(html, "html.parser")
+async def _read_upload(upload: UploadFile, limit: int, too_large_detail: str) -> bytes:
+    """Läser en uppladdning i bitar och avbryter så fort gränsen passeras."""
+
+    if upload.size is not None and upload.size > limit:
+        raise HTTPException(status_code=413, detail=too_large_detail)
+    buf = bytearray()
+    while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+        buf.extend(chunk)
+        if len(buf) > limit:
+            raise HTTPException(status_code=413, detail=too_large_detail)
+    return bytes(buf)
+
+
+# Innehållstyper som URL-importen kan läsa text ur
+_TEXTLIKE_CONTENT_TYPES = ("text/", "application/xhtml", "application/xml")
+
+# Blanksteg runt radbrytningar och tomma rader kollapsas till en enda radbrytning
+_LINE_BREAK_RUN_RE = re.compile(r"\s*\n\s*")
+
+
+def _html_to_text_and_title(html: str, limit: Optional[int] = None) -> Tuple[str, Optional[str]]:
+    tree = LexborHTMLParser(html)
     title: Optional[str] = None
-    if soup.title and isinstance(soup.title.string, str):
-        title = soup.title.string.strip()
-    for tag in soup(["script", "style", "noscript", "template"]):
-        tag.decompose()
-    if soup.head:
-        soup.head.decompose()
-    text = soup.get_text(separator="\n")
-    lines = [line.strip() for line in text.splitlines()]
-    clean = "\n".join(line for line in lines if line)
+    title_node = tree.css_first("title")
+    if title_node is not None:
+        title = title_node.text(strip=True) or None
+    for node in tree.css("script, style, noscript, template, head"):
+        node.decompose()
+    root = tree.body if tree.body is not None else tree.root
+    text = root.text(separator="\n").strip() if root is not None else ""
+    if limit is not None and len(text) > limit * 2:
+        # Kollapsa bara början av sidan; räcker det inte efter kollapsen
+        # (mycket blanksteg) faller vi tillbaka på hela texten.
+        clean = _LINE_BREAK_RUN_RE.sub("\n", text[: limit * 2])
+        if len(clean) > limit:
+            return clean, title
+    clean = _LINE_BREAK_RUN_RE.sub("\n", text)
     return clean, title
 
 
-def _extract_pdf_text(data: bytes, max_pages: int = MAX_PDF_PAGES) -> Tuple[str, int, int]:
-    reader = PdfReader(io.BytesIO(data))
-    total_pages = len(reader.pages)
-    use_pages = min(total_pages, max_pages)
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    global _pdf_pool
+    if _pdf_pool is None:
+        # Arbetarna startas via forkserver (spawn där det saknas) i stället för att forkas
+        # från den trådade serverprocessen; de importerar bara app.pdf_worker.
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context(method))
+    return _pdf_pool
+
+
+@app.on_event("shutdown")
+def _shutdown_pdf_pool() -> None:
+    if _pdf_pool is not None:
+        _pdf_pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def _extract_pdf_text(
+    data: bytes,
+    max_pages: int = MAX_PDF_PAGES,
+    char_limit: Optional[int] = None,
+) -> Tuple[str, int, int]:
+    loop = asyncio.get_running_loop()
+    pool = _get_pdf_pool()
+    # Små dokument räknas och läses i ett och samma jobb (ett enda anrop till poolen)
+    split_pages = PDF_PARALLEL_MIN_PAGES if PDF_WORKERS > 1 else None
+    total_pages, texts = await loop.run_in_executor(
+        pool, extract_small_pdf, (data, max_pages, char_limit, split_pages)
+    )
+    if texts is not None:
+        chunks: List[List[str]] = [texts]
+    else:
+        # Större dokument delas i ett sammanhängande sidintervall per arbetare
+        # så att PDF-datan bara skickas över en gång per process
+        use_pages = min(total_pages, max_pages)
+        step = max(1, -(-use_pages // PDF_WORKERS))
+        jobs = [(data, start, min(start + step, use_pages), char_limit) for start in range(0, use_pages, step)]
+        chunks = await asyncio.gather(
+            *(loop.run_in_executor(pool, extract_pdf_page_range, job) for job in jobs)
+        )
+
     parts: List[str] = []
-    for idx in range(use_pages):
-        page = reader.pages[idx]
-        try:
-            page_text = page.extract_text() or ""
-        except Exception:
-            page_text = ""
-        page_text = page_text.strip()
-        if page_text:
-            parts.append(page_text)
+    total = 0
+    pages_read = 0
+    for text in (text for chunk in chunks for text in chunk):
+        pages_read += 1
+        if text:
+            parts.append(text)
+            total += len(text)
+        if char_limit is not None and total > char_limit:
+            break
     combined = "\n\n".join(parts).strip()
-    return combined, total_pages, use_pages
+    return combined, total_pages, pages_read
 
 WHISPER_MODEL_NAME = os.getenv("WHISPER_MODEL", "tiny")
-WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "int8")
+WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "auto").strip().lower()
+# Beräkningstyper som CTranslate2 stöder (int4 finns inte för Whisper)
+WHISPER_COMPUTE_TYPES = frozenset({
+    "auto", "default", "int8", "int8_float16", "int8_float32", "int8_bfloat16",
+    "int16", "float16", "bfloat16", "float32",
+})
+WHISPER_DEVICE = os.getenv("WHISPER_DEVICE", "auto")
+WHISPER_SAMPLE_RATE = 16000
+WHISPER_PRELOAD = os.getenv("WHISPER_PRELOAD", "1").strip().lower() not in {"0", "false", "no", "off"}
 _whisper_model = None
+# Modellen laddas i arbetartrådar; låset hindrar att två samtidiga första anrop laddar den två gånger
+_whisper_model_lock = threading.Lock()
 
 
-def _add_address(value, ipv4, ipv6):
+def _add_address(value, ipv4, ipv6) -> bool:
     if not value:
-        return
-    value = value.split('%')[0]  # ta bort ev. interface-suffix från IPv6
-    if value in {"0.0.0.0", "::", "::1"}:
-        return
-    if value.startswith("127."):
-        return
-    if ":" in value:
-        ipv6.add(value)
+        return False
+    try:
+        ip = ipaddress.ip_address(value.partition('%')[0])  # ta bort ev. interface-suffix från IPv6
+    except ValueError:
+        return False
+    # Loopback, 0.0.0.0/:: och länklokala adresser (169.254.x, fe80::) går inte att nå från andra enheter
+    if ip.is_loopback or ip.is_unspecified or ip.is_link_local:
+        return False
+    if ip.version == 6:
+        ipv6.append(str(ip))
     else:
-        ipv4.add(value)
+        ipv4.append(str(ip))
+    return True
 
 
 def get_network_addresses():
-    ipv4 = set()
-    ipv6 = set()
-
-    try:
-        hostname = socket.gethostname()
-        for info in socket.getaddrinfo(hostname, None):
-            addr = info[4][0]
-            _add_address(addr, ipv4, ipv6)
-    except OSError:
-        pass
+    ipv4: List[str] = []
+    ipv6: List[str] = []
 
+    # Adressen för standardrutten först – det är oftast den användaren vill ha.
+    # Båda IPv4-målen ger samma källadress, så den andra provas bara om den första misslyckas.
     for target in (("1.1.1.1", 80), ("8.8.8.8", 80)):
         try:
             with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
                 s.connect(target)
-                _add_address(s.getsockname()[0], ipv4, ipv6)
+                if _add_address(s.getsockname()[0], ipv4, ipv6):
+                    break
         except OSError:
             continue
 
@@ -127,36 +291,171 @@ def get_network_addresses():
     except OSError:
         pass
 
-    return sorted(ipv4) + sorted(ipv6)
+    try:
+        hostname = socket.gethostname()
+        for info in socket.getaddrinfo(hostname, None):
+            addr = info[4][0]
+            _add_address(addr, ipv4, ipv6)
+    except OSError:
+        pass
+
+    # dict.fromkeys tar bort dubbletter och behåller ordningen
+    return list(dict.fromkeys(ipv4 + ipv6))
+
+
+NETWORK_ADDRESS_TTL = 60.0  # sekunder
+_network_address_cache: Optional[Tuple[float, List[str]]] = None
+
+
+async def get_cached_network_addresses() -> List[str]:
+    """Adresserna ändras sällan, så resultatet återanvänds i NETWORK_ADDRESS_TTL sekunder.
+    Uppslaget (DNS + socket-anrop) körs i en tråd så att event-loopen inte blockeras."""
+
+    global _network_address_cache
+    cached = _network_address_cache
+    if cached is not None and time.monotonic() - cached[0] < NETWORK_ADDRESS_TTL:
+        return cached[1]
+    addresses = await asyncio.to_thread(get_network_addresses)
+    _network_address_cache = (time.monotonic(), addresses)
+    return addresses
+
+
+def _resolve_compute_type() -> str:
+    compute_type = WHISPER_COMPUTE_TYPE
+    if compute_type not in WHISPER_COMPUTE_TYPES:
+        logger.warning("Okänd WHISPER_COMPUTE_TYPE %r, använder auto", compute_type)
+        compute_type = "auto"
+    return compute_type
+
+
+def _resolve_whisper_model() -> Tuple[str, str]:
+    """WHISPER_MODEL kan vara ett modellnamn ("tiny") eller en lokal katalog
+    med en förkvantiserad CTranslate2-modell (se scripts/convert_whisper.sh)."""
+
+    compute_type = _resolve_compute_type()
+    local_path = os.path.expanduser(WHISPER_MODEL_NAME)
+    if os.path.isdir(local_path):
+        # Behåll vikttypen som modellen kvantiserades med vid konverteringen
+        if compute_type == "auto":
+            compute_type = "default"
+        return os.path.abspath(local_path), compute_type
+    return WHISPER_MODEL_NAME, compute_type
 
 
 def get_whisper_model():
     global _whisper_model
-    if _whisper_model is None:
-        # På Raspberry Pi (CPU), använd compute_type=int8 för bäst fart
-        _whisper_model = WhisperModel(WHISPER_MODEL_NAME, device="cpu", compute_type=WHISPER_COMPUTE_TYPE)
+    if _whisper_model is not None:
+        return _whisper_model
+    with _whisper_model_lock:
+        if _whisper_model is not None:
+            return _whisper_model
+        from faster_whisper import WhisperModel
+
+        model_path, compute_type = _resolve_whisper_model()
+        # "auto" låter CTranslate2 välja snabbaste kärnor för hårdvaran
+        # (t.ex. int8 med VNNI/NEON på CPU, int8_float16 på GPU; CTranslate2
+        # saknar float16-beräkning på CPU).
+        # En kärna lämnas ledig åt event-loopen och övriga anrop.
+        _whisper_model = WhisperModel(
+            model_path,
+            device=WHISPER_DEVICE,
+            compute_type=compute_type,
+            cpu_threads=max(1, (os.cpu_count() or 1) - 1),
+            num_workers=1,
+        )
     return _whisper_model
 
+
+def _warmup_whisper_model() -> None:
+    model = get_whisper_model()
+    # En sekund tystnad räcker för att CTranslate2 ska initiera sina kärnor
+    segments, _ = model.transcribe(np.zeros(WHISPER_SAMPLE_RATE, dtype=np.float32), language="sv", beam_size=1)
+    for _ in segments:
+        pass
+
+
+@app.on_event("startup")
+async def _preload_whisper_model() -> None:
+    if not WHISPER_PRELOAD:
+        return
+    try:
+        await asyncio.to_thread(_warmup_whisper_model)
+    except Exception as exc:
+        # Appen ska starta även om modellen inte kan laddas; första anropet försöker igen
+        logger.warning("Kunde inte förladda Whisper-modellen: %s", exc)
+
+
+def _decode_pcm_audio(raw: bytes) -> Optional[np.ndarray]:
+    """Avkodar WAV/FLAC/OGG direkt till float32 om det redan är 16 kHz.
+
+    Returnerar None när formatet inte stöds av libsndfile eller när ljudet
+    behöver samplas om – då används ffmpeg i stället.
+    """
+
+    import soundfile as sf
+
+    try:
+        data, sample_rate = sf.read(io.BytesIO(raw), dtype="float32", always_2d=True)
+    except Exception:
+        return None
+    if sample_rate != WHISPER_SAMPLE_RATE or data.size == 0:
+        return None
+    if data.shape[1] > 1:
+        return data.mean(axis=1)
+    return np.ascontiguousarray(data[:, 0])
+
+
+def _decode_with_ffmpeg(raw: bytes) -> np.ndarray:
+    # ffmpeg läser från stdin och skriver 16 kHz mono PCM till stdout – inga temporära filer
+    proc = subprocess.run(
+        [
+            "ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-i", "pipe:0",
+            "-f", "s16le", "-ac", "1", "-ar", str(WHISPER_SAMPLE_RATE),
+            "pipe:1",
+        ],
+        input=raw,
+        capture_output=True,
+        check=False,
+    )
+    if proc.returncode != 0:
+        message = proc.stderr.decode("utf-8", errors="replace").strip().splitlines()
+        raise RuntimeError(message[-1] if message else f"ffmpeg avslutades med kod {proc.returncode}")
+    return np.frombuffer(proc.stdout, np.int16).astype(np.float32) / 32768.0
+
+
+def _transcribe_with_model(audio: np.ndarray) -> dict:
+    model = get_whisper_model()
+    # Fast språk (ingen språkdetektering), girig avkodning och VAD som hoppar över tystnad
+    segments, info = model.transcribe(
+        audio,
+        language="sv",
+        beam_size=1,
+        vad_filter=True,
+        vad_parameters={"min_silence_duration_ms": 500},
+        condition_on_previous_text=False,
+    )
+    # segments är en lat generator – själva avkodningen sker här
+    text = "".join(s.text for s in segments).strip()
+    return {"text": text, "language": info.language, "duration": info.duration}
+
+
+def _transcribe_audio(raw: bytes) -> dict:
+    # 16 kHz PCM avkodas direkt, övriga format (webm/ogg/m4a/mp3/wav) via ffmpeg
+    audio = _decode_pcm_audio(raw)
+    if audio is None:
+        audio = _decode_with_ffmpeg(raw)
+    return _transcribe_with_model(audio)
+
+
 @app.post("/api/transcribe")
 async def transcribe(audio: UploadFile = File(...)):
-    # Spara inkommande ljud till temp, konvertera till WAV 16k mono, kör ASR
+    raw = await _read_upload(audio, MAX_AUDIO_BYTES, AUDIO_TOO_LARGE_DETAIL)
+    if not raw:
+        raise HTTPException(status_code=400, detail="Filen är tom.")
     try:
-        with tempfile.TemporaryDirectory() as td:
-            in_path = os.path.join(td, audio.filename)
-            out_wav = os.path.join(td, "speech.wav")
-            raw = await audio.read()
-            with open(in_path, "wb") as f:
-                f.write(raw)
-
-            # Konvertera (stöd för webm/ogg/m4a/mp3/wav) -> wav 16k mono
-            seg = AudioSegment.from_file(in_path)
-            seg = seg.set_channels(1).set_frame_rate(16000)
-            seg.export(out_wav, format="wav")
-
-            model = get_whisper_model()
-            segments, info = model.transcribe(out_wav, language="sv", beam_size=1)
-            text = "".join(s.text for s in segments).strip()
-            return {"text": text, "language": info.language, "duration": info.duration}
+        # CPU-tungt arbete körs i en tråd så att event-loopen inte blockeras
+        return await asyncio.to_thread(_transcribe_audio, raw)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Transkribering misslyckades: {e}")
 
@@ -182,31 +481,81 @@ async def rag_page(request: Request):
     })
 
 
+def _etag_response(request: Request, data: dict, max_age: int = 30) -> Response:
+    """JSON-svar med ETag; klienten får 304 utan kropp om den redan har samma innehåll."""
+
+    body = orjson.dumps(data)
+    etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={max_age}"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match:
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in candidates or "*" in candidates:
+            return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
 @app.get("/api/info")
-async def app_info():
-    return {
+async def app_info(request: Request):
+    return _etag_response(request, {
         "host": APP_HOST,
         "port": APP_PORT,
         "default_model": DEFAULT_MODEL,
         "ollama_host": OLLAMA_HOST,
         "embedding_model": EMBED_MODEL,
-        "addresses": get_network_addresses()
-    }
+        "addresses": await get_cached_network_addresses(),
+    })
+
+
+MODELS_CACHE_TTL = 5.0  # sekunder
+_models_cache: Optional[Tuple[float, List[str]]] = None
+
+
+async def _fetch_model_names() -> List[str]:
+    # Flera flikar som laddas samtidigt delar på samma svar från Ollama
+    global _models_cache
+    cached = _models_cache
+    if cached is not None and time.monotonic() - cached[0] < MODELS_CACHE_TTL:
+        return cached[1]
+    r = await ollama_client.get("/api/tags", timeout=60)
+    r.raise_for_status()
+    data = orjson.loads(r.content)
+    # Förenkla svaret
+    models = [m.get("name") for m in data.get("models", []) if m.get("name")]
+    _models_cache = (time.monotonic(), models)
+    return models
+
 
 @app.get("/api/models")
-async def list_models():
+async def list_models(request: Request):
     # Proxy till Ollamas /api/tags
-    url = f"{OLLAMA_HOST}/api/tags"
     try:
-        async with httpx.AsyncClient(timeout=60) as client:
-            r = await client.get(url)
-            r.raise_for_status()
-            data = r.json()
-            # Förenkla svaret
-            models = [m.get("name") for m in data.get("models", []) if m.get("name")]
-            return {"models": models}
+        models = await _fetch_model_names()
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Kunde inte hämta modeller: {e}")
+    return _etag_response(request, {"models": models}, max_age=int(MODELS_CACHE_TTL))
+
+
+def _content_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+async def _add_document_deduplicated(normalized: str, metadata: dict) -> dict:
+    """Lägger till dokumentet om samma innehåll inte redan finns i kunskapsbasen.
+    Embeddings är det dyraste steget, så identiska importer återanvänder det befintliga dokumentet."""
+
+    content_hash = _content_hash(normalized)
+    existing = await rag_store.find_by_hash(content_hash)
+    if existing is not None:
+        return {"document": existing, "deduplicated": True}
+    metadata["content_hash"] = content_hash
+    try:
+        document = await rag_store.add_document(normalized, metadata=metadata)
+        return {"document": document}
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except RuntimeError as re:
+        raise HTTPException(status_code=502, detail=str(re))
 
 
 @app.get("/api/rag/docs")
@@ -244,17 +593,15 @@ async def add_rag_document_from_url(payload: dict):
     if not raw_url:
         raise HTTPException(status_code=400, detail="Ange en URL att hämta.")
 
-    parsed = urlparse(raw_url)
-    if not parsed.scheme:
+    if "://" not in raw_url[:10]:
         raw_url = f"https://{raw_url}"
-        parsed = urlparse(raw_url)
+    parsed = urlparse(raw_url)
     if not parsed.netloc:
         raise HTTPException(status_code=400, detail="Ogiltig URL. Ange en fullständig adress.")
 
     try:
-        async with httpx.AsyncClient(timeout=60, follow_redirects=True) as client:
-            response = await client.get(raw_url, headers={"User-Agent": "Ollama-WebUI/1.0"})
-            response.raise_for_status()
+        response = await web_client.get(raw_url)
+        response.raise_for_status()
     except httpx.HTTPStatusError as exc:  # type: ignore[no-untyped-def]
         status_code = exc.response.status_code if exc.response else 500
         if 400 <= status_code < 500:
@@ -264,10 +611,10 @@ async def add_rag_document_from_url(payload: dict):
         raise HTTPException(status_code=502, detail=f"Kunde inte hämta sidan: {exc}") from exc
 
     content_type = response.headers.get("content-type", "").lower()
-    if "html" not in content_type and "text" not in content_type:
+    if not content_type.startswith(_TEXTLIKE_CONTENT_TYPES):
         raise HTTPException(status_code=400, detail="URL:en verkar inte innehålla någon läsbar text.")
 
-    text, title = _html_to_text_and_title(response.text)
+    text, title = _html_to_text_and_title(response.text, limit=MAX_IMPORTED_CHARS)
     normalized, truncated = _normalize_document_text(text)
     if not normalized:
         raise HTTPException(status_code=400, detail="Kunde inte läsa någon text från sidan.")
@@ -275,20 +622,16 @@ async def add_rag_document_from_url(payload: dict):
     metadata = {
         "type": "url",
         "url": raw_url,
-        "original_characters": len(text),
     }
     if title:
         metadata["title"] = title
     if truncated:
         metadata["truncated"] = True
+    else:
+        # Extraheringen slutar vid importgränsen, så hela längden är bara känd när inget kapats
+        metadata["original_characters"] = len(text)
 
-    try:
-        document = await rag_store.add_document(normalized, metadata=metadata)
-        return {"document": document}
-    except ValueError as ve:
-        raise HTTPException(status_code=400, detail=str(ve))
-    except RuntimeError as re:
-        raise HTTPException(status_code=502, detail=str(re))
+    return await _add_document_deduplicated(normalized, metadata)
 
 
 @app.post("/api/rag/docs/pdf")
@@ -297,14 +640,12 @@ async def add_rag_document_from_pdf(file: UploadFile = File(...)):
     if not filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Endast PDF-filer stöds.")
 
-    data = await file.read()
+    data = await _read_upload(file, MAX_PDF_BYTES, PDF_TOO_LARGE_DETAIL)
     if not data:
         raise HTTPException(status_code=400, detail="Filen är tom.")
-    if len(data) > MAX_PDF_BYTES:
-        raise HTTPException(status_code=400, detail="PDF-filen är för stor. Max 8 MB stöds.")
 
     try:
-        text, total_pages, used_pages = _extract_pdf_text(data)
+        text, total_pages, used_pages = await _extract_pdf_text(data, char_limit=MAX_IMPORTED_CHARS)
     except Exception as exc:
         raise HTTPException(status_code=400, detail=f"Kunde inte läsa PDF-filen: {exc}") from exc
 
@@ -317,18 +658,14 @@ async def add_rag_document_from_pdf(file: UploadFile = File(...)):
         "filename": filename,
         "total_pages": total_pages,
         "pages_used": used_pages,
-        "original_characters": len(text),
     }
     if truncated:
         metadata["truncated"] = True
+    else:
+        # Extraheringen slutar vid importgränsen, så hela längden är bara känd när inget kapats
+        metadata["original_characters"] = len(text)
 
-    try:
-        document = await rag_store.add_document(normalized, metadata=metadata)
-        return {"document": document}
-    except ValueError as ve:
-        raise HTTPException(status_code=400, detail=str(ve))
-    except RuntimeError as re:
-        raise HTTPException(status_code=502, detail=str(re))
+    return await _add_document_deduplicated(normalized, metadata)
 
 
 @app.delete("/api/rag/docs/{doc_id}")
@@ -345,9 +682,40 @@ async def clear_rag_documents():
     await rag_store.clear()
     return {"cleared": True}
 
+RAG_CONTEXT_INTRO = (
+    "Använd följande utdrag från kunskapsbasen när du svarar. "
+    "Om informationen inte räcker ska du säga att du saknar underlag."
+)
+
+
+def _cached_chat_response(model: str, content: str, stream: bool):
+    data = {
+        "model": model,
+        "message": {"role": "assistant", "content": content},
+        "done": True,
+        "cached": True,
+    }
+    if not stream:
+        return ORJSONResponse({**data, "rag_context": [], "rag_used": False})
+
+    async def replay():
+        yield orjson.dumps({"rag_context": [], "rag_used": False}) + b"\n"
+        yield orjson.dumps(data) + b"\n"
+
+    return StreamingResponse(replay(), media_type="application/x-ndjson")
+
+
+def _requests_sampling(options) -> bool:
+    temperature = options.get("temperature") if isinstance(options, dict) else None
+    try:
+        return temperature is not None and float(temperature) > 0
+    except (TypeError, ValueError):
+        return False
+
+
 @app.post("/api/chat")
 async def chat(payload: dict):
-    # payload: { messages: [...], model?: str, options?: {...}, use_rag?: bool, rag_top_k?: int }
+    # payload: { messages: [...], model?: str, options?: {...}, use_rag?: bool, rag_top_k?: int, stream?: bool, cache?: bool }
     messages = payload.get("messages", [])
     model = payload.get("model") or DEFAULT_MODEL
     options = payload.get("options", {})
@@ -363,75 +731,158 @@ async def chat(payload: dict):
         rag_top_k = 3
     rag_top_k = max(1, min(rag_top_k, 10))
 
-    enriched_messages = list(messages)
+    # Meddelandelistan kopieras bara när RAG-kontext faktiskt ska läggas till
+    enriched_messages = messages
     rag_matches: List[RAGResult] = []
 
     if use_rag:
         user_prompt = ""
-        for msg in reversed(enriched_messages):
-            if isinstance(msg, dict) and msg.get("role") == "user":
-                user_prompt = str(msg.get("content", "")).strip()
-                if user_prompt:
-                    break
+        # Oftast är sista meddelandet användarens fråga; annars söks bakåt
+        last = messages[-1]
+        if isinstance(last, dict) and last.get("role") == "user":
+            user_prompt = str(last.get("content", "")).strip()
+        if not user_prompt:
+            for msg in reversed(messages):
+                if isinstance(msg, dict) and msg.get("role") == "user":
+                    user_prompt = str(msg.get("content", "")).strip()
+                    if user_prompt:
+                        break
         if user_prompt:
             try:
                 rag_matches = await rag_store.search(user_prompt, top_k=rag_top_k)
             except RuntimeError as err:
                 raise HTTPException(status_code=502, detail=str(err))
             if rag_matches:
-                context_intro = (
-                    "Använd följande utdrag från kunskapsbasen när du svarar. "
-                    "Om informationen inte räcker ska du säga att du saknar underlag."
-                )
-                context_body = "\n\n".join(
-                    f"Utdrag {idx + 1}:\n{match.text}"
-                    for idx, match in enumerate(rag_matches)
-                )
+                # Hela kontexten byggs i en lista och slås ihop en gång
+                parts = [RAG_CONTEXT_INTRO]
+                append = parts.append
+                for idx, match in enumerate(rag_matches, start=1):
+                    append("\n\nUtdrag ")
+                    append(str(idx))
+                    append(":\n")
+                    append(match.text)
                 context_message = {
                     "role": "system",
-                    "content": f"{context_intro}\n\n{context_body}",
+                    "content": "".join(parts),
                 }
-                if enriched_messages and isinstance(enriched_messages[0], dict) and enriched_messages[0].get("role") == "system":
+                if isinstance(messages[0], dict) and messages[0].get("role") == "system":
                     insert_at = 1
                 else:
                     insert_at = 0
-                enriched_messages.insert(insert_at, context_message)
+                enriched_messages = [*messages[:insert_at], context_message, *messages[insert_at:]]
+
+    stream = payload.get("stream", True) is not False
+
+    # Cachen används bara utan RAG, när klienten inte skickat "cache": false, när inte
+    # slumpade svar begärts (temperature > 0) och när sista meddelandet är användarens fråga
+    cache_key: Optional[str] = None
+    cache_vector: Optional[np.ndarray] = None
+    last_message = messages[-1]
+    use_cache = (
+        CHAT_CACHE_ENABLED
+        and not use_rag
+        and payload.get("cache", True) is not False
+        and not _requests_sampling(options)
+    )
+    if use_cache and isinstance(last_message, dict) and last_message.get("role") == "user":
+        prompt = str(last_message.get("content", "")).strip()
+        if prompt:
+            try:
+                cache_vector = await rag_store.embed_query(prompt)
+            except RuntimeError:
+                cache_vector = None  # utan embeddings-modell körs chatten som vanligt
+            if cache_vector is not None:
+                cache_key = SemanticCache.context_key(model, options, messages[:-1])
+                cached = chat_cache.lookup(cache_key, cache_vector)
+                if cached is not None:
+                    return _cached_chat_response(model, cached, stream)
 
     body = {
         "model": model,
         "messages": enriched_messages,
-        "stream": False,
+        "stream": stream,
         "options": options,
     }
-    url = f"{OLLAMA_HOST}/api/chat"
-    try:
-        async with httpx.AsyncClient(timeout=300) as client:
-            r = await client.post(url, json=body)
+    rag_context = [
+        {
+            "doc_id": match.doc_id,
+            "chunk_index": match.chunk_index,
+            "score": match.score,
+            "text": match.text,
+        }
+        for match in rag_matches
+    ] if use_rag else []
+    rag_used = use_rag and bool(rag_matches)
+
+    if not stream:
+        try:
+            r = await ollama_client.post("/api/chat", json=body)
             r.raise_for_status()
-            data = r.json()
+            data = orjson.loads(r.content)
             if isinstance(data, dict):
-                data["rag_context"] = [
-                    {
-                        "doc_id": match.doc_id,
-                        "chunk_index": match.chunk_index,
-                        "score": match.score,
-                        "text": match.text,
-                    }
-                    for match in rag_matches
-                ] if use_rag else []
-                data["rag_used"] = use_rag and bool(rag_matches)
-            return JSONResponse(data)
-    except httpx.HTTPStatusError as se:
-        # Vid typiska fel: modell saknas, minne etc.
-        text = se.response.text
-        raise HTTPException(status_code=se.response.status_code, detail=f"Ollama-fel ({se.response.status_code}): {text}")
+                if cache_key is not None and data.get("done"):
+                    chat_cache.store(cache_key, cache_vector, str((data.get("message") or {}).get("content") or ""))
+                data["rag_context"] = rag_context
+                data["rag_used"] = rag_used
+            return ORJSONResponse(data)
+        except httpx.HTTPStatusError as se:
+            # Vid typiska fel: modell saknas, minne etc.
+            text = se.response.text
+            raise HTTPException(status_code=se.response.status_code, detail=f"Ollama-fel ({se.response.status_code}): {text}")
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Kunde inte nå Ollama: {e}")
+
+    try:
+        request = ollama_client.build_request("POST", "/api/chat", json=body)
+        r = await ollama_client.send(request, stream=True)
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Kunde inte nå Ollama: {e}")
+    if r.is_error:
+        # Vid typiska fel: modell saknas, minne etc.
+        await r.aread()
+        await r.aclose()
+        raise HTTPException(status_code=r.status_code, detail=f"Ollama-fel ({r.status_code}): {r.text}")
+
+    async def relay():
+        # Första raden bär RAG-kontexten, sedan vidarebefordras Ollamas NDJSON rad för rad
+        try:
+            yield orjson.dumps({"rag_context": rag_context, "rag_used": rag_used}) + b"\n"
+            # Svarstexten samlas ihop för cachen; ett avbrutet eller felaktigt svar cachas inte
+            collect = cache_key is not None
+            parts: List[str] = []
+            done = False
+            async for line in r.aiter_lines():
+                if not line:
+                    continue
+                yield line + "\n"
+                if collect:
+                    try:
+                        chunk = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        collect = False
+                        continue
+                    if not isinstance(chunk, dict) or chunk.get("error"):
+                        collect = False
+                        continue
+                    message = chunk.get("message")
+                    if isinstance(message, dict):
+                        parts.append(str(message.get("content") or ""))
+                    done = bool(chunk.get("done"))
+            if collect and done:
+                chat_cache.store(cache_key, cache_vector, "".join(parts))
+        except httpx.HTTPError as e:
+            yield orjson.dumps({"error": f"Kunde inte nå Ollama: {e}"}) + b"\n"
+        finally:
+            await r.aclose()
+
+    return StreamingResponse(relay(), media_type="application/x-ndjson")
 
 if __name__ == "__main__":
-    import uvicorn
+    # Kvar för `python -m app.main`; kör via app/__main__.py så att PDF-arbetarna
+    # inte importerar om den här modulen som huvudmodul.
+    import runpy
 
-    uvicorn.run("app.main:app", host=APP_HOST, port=APP_PORT, reload=False)
+    runpy.run_module("app", run_name="__main__", alter_sys=True)
 
 
 def _safe_int(value: Optional[str], fallback: int) -> int:
@@ -446,106 +897,186 @@ DEFAULT_TTS_RATE = _safe_int(os.getenv("TTS_RATE", "180"), 180)
 DEFAULT_TTS_VOICE_HINT = os.getenv("TTS_VOICE_HINT", "sv") or "sv"
 
 
-@lru_cache(maxsize=1)
-def _pyttsx3_voice_catalog() -> List[dict]:
-    """Hämtar och cachar tillgängliga röster från pyttsx3."""
+ESPEAK_BINARY = os.getenv("ESPEAK_BINARY", "espeak-ng") or "espeak-ng"
+MBROLA_PATH = os.getenv("MBROLA_PATH", "/usr/share/mbrola") or "/usr/share/mbrola"
+TTS_VOICE_CACHE_PATH = os.path.abspath(
+    os.path.expanduser(os.getenv("TTS_VOICE_CACHE_PATH", "~/.ollama_webui_voices.json"))
+)
+TTS_VOICE_CACHE_TTL = 7 * 24 * 3600  # sekunder
+# Röstvarianter (t.ex. viskning) läggs ovanpå den här rösten: "sv+whisper"
+ESPEAK_VARIANT_BASE = "sv"
+
+
+def _espeak_list_voices(spec: Optional[str] = None) -> List[Tuple[str, str, List[str]]]:
+    """Kör `espeak-ng --voices[=spec]` och returnerar (fil, namn, språk) per rad."""
+
+    flag = f"--voices={spec}" if spec else "--voices"
+    proc = subprocess.run([ESPEAK_BINARY, flag], capture_output=True, check=True, timeout=10)
+    entries: List[Tuple[str, str, List[str]]] = []
+    # Kolumner: Pty Language Age/Gender VoiceName File Other Languages
+    for line in proc.stdout.decode("utf-8", errors="replace").splitlines()[1:]:
+        fields = line.split()
+        if len(fields) < 5:
+            continue
+        languages = [fields[1]]
+        languages.extend(f.strip("()") for f in fields[5:] if not f.strip("()").isdigit())
+        entries.append((fields[4], fields[3], languages))
+    return entries
 
+
+def _scan_espeak_voices() -> List[dict]:
     voices: List[dict] = []
-    engine = pyttsx3.init()
-    try:
-        for voice in engine.getProperty("voices"):
-            languages: List[str] = []
-            raw_languages = getattr(voice, "languages", None)
-            if raw_languages:
-                try:
-                    for lang in raw_languages:
-                        if isinstance(lang, bytes):
-                            languages.append(lang.decode("utf-8", "ignore"))
-                        else:
-                            languages.append(str(lang))
-                except TypeError:
-                    pass
-            haystack_parts = [voice.id or "", voice.name or "", *languages]
-            voices.append(
-                {
-                    "id": voice.id,
-                    "name": voice.name or "",
-                    "languages": languages,
-                    "haystack": " ".join(part.lower() for part in haystack_parts if part),
-                }
-            )
-    finally:
+
+    def add(voice_id: str, name: str, languages: List[str]) -> None:
+        haystack_parts = [voice_id, name, *languages]
+        voices.append(
+            {
+                "id": voice_id,
+                "name": name,
+                "languages": languages,
+                "haystack": " ".join(part.lower() for part in haystack_parts if part),
+            }
+        )
+
+    for voice_id, name, languages in _espeak_list_voices():
+        add(voice_id, name, languages)
+    for voice_id, name, languages in _espeak_list_voices("mb"):
+        # Röstfilerna följer med espeak-ng, men själva MBROLA-databasen måste vara installerad
+        database = voice_id.rpartition("/")[2].removeprefix("mb-")
+        if os.path.isdir(os.path.join(MBROLA_PATH, database)):
+            add(voice_id, name, languages)
+    for variant_file, name, _ in _espeak_list_voices("variant"):
+        variant = variant_file.rpartition("/")[2]
+        add(f"{ESPEAK_VARIANT_BASE}+{variant}", f"{name} ({ESPEAK_VARIANT_BASE})", [ESPEAK_VARIANT_BASE])
+    return voices
+
+
+def _voice_cache_key() -> list:
+    # Cachen blir ogiltig när espeak-ng eller MBROLA-rösterna installeras om
+    key: list = [ESPEAK_BINARY, MBROLA_PATH, ESPEAK_VARIANT_BASE]
+    for path in (shutil.which(ESPEAK_BINARY), MBROLA_PATH):
         try:
-            engine.stop()
-        except Exception:
-            pass
+            key.append(os.stat(path).st_mtime_ns if path else None)
+        except OSError:
+            key.append(None)
+    return key
+
+
+def _load_voice_cache(key: list) -> Optional[List[dict]]:
+    try:
+        with open(TTS_VOICE_CACHE_PATH, "r", encoding="utf-8") as fh:
+            cached = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cached, dict) or cached.get("key") != key:
+        return None
+    created = cached.get("created")
+    if not isinstance(created, (int, float)) or time.time() - created > TTS_VOICE_CACHE_TTL:
+        return None
+    voices = cached.get("voices")
+    return voices if isinstance(voices, list) else None
+
+
+def _save_voice_cache(key: list, voices: List[dict]) -> None:
+    tmp_path = f"{TTS_VOICE_CACHE_PATH}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump({"key": key, "created": time.time(), "voices": voices}, fh, ensure_ascii=False)
+        os.replace(tmp_path, TTS_VOICE_CACHE_PATH)
+    except OSError as exc:
+        logger.warning("Kunde inte spara röstcachen: %s", exc)
+
+
+@lru_cache(maxsize=1)
+def _espeak_voice_catalog() -> List[dict]:
+    """Hämtar och cachar tillgängliga röster från espeak-ng. Listan sparas även
+    på disk så att en omstart inte behöver fråga espeak-ng igen."""
+
+    key = _voice_cache_key()
+    voices = _load_voice_cache(key)
+    if voices is None:
+        voices = _scan_espeak_voices()
+        _save_voice_cache(key, voices)
     return voices
 
 
-def _match_voice(predicate) -> Optional[str]:
-    for voice in _pyttsx3_voice_catalog():
-        if predicate(voice):
+# Nyckelord som röstvalet och /api/tts/options frågar efter
+_VOICE_TAGS = ("sv", "swedish", "mb", "whisper")
+
+
+@lru_cache(maxsize=1)
+def _voice_index() -> Tuple[Dict[str, dict], Dict[str, Tuple[str, ...]]]:
+    """Röster per id och röst-id:n per nyckelord (i katalogordning). Byggs en gång
+    eftersom röstkatalogen inte ändras under processens livstid."""
+
+    voices = _espeak_voice_catalog()
+    by_id = {voice["id"]: voice for voice in voices}
+    by_tag = {
+        tag: tuple(voice["id"] for voice in voices if tag in voice.get("haystack", ""))
+        for tag in _VOICE_TAGS
+    }
+    return by_id, by_tag
+
+
+def _tagged_ids(*tags: str) -> List[str]:
+    """Id:n som har alla nyckelorden, i katalogordning."""
+
+    _, by_tag = _voice_index()
+    first, *rest = tags
+    others = [frozenset(by_tag[tag]) for tag in rest]
+    return [voice_id for voice_id in by_tag[first] if all(voice_id in other for other in others)]
+
+
+def _match_voice(needle: str) -> Optional[str]:
+    # Fritt angivna önskemål kan inte slås upp i indexet och söks därför i katalogen
+    for voice in _espeak_voice_catalog():
+        if needle in voice.get("haystack", ""):
             return voice["id"]
     return None
 
 
+@lru_cache(maxsize=128)
 def _select_voice_id(engine_choice: str, voice_pref: Optional[str], voice_id: Optional[str]) -> Optional[str]:
-    voices = _pyttsx3_voice_catalog()
-    if voice_id and any(v["id"] == voice_id for v in voices):
-        return voice_id
+    """Väljer röst-id för given motor/önskemål. Resultatet cachas per kombination
+    eftersom röstkatalogen inte ändras under processens livstid."""
 
-    def haystack_contains(voice: dict, *needles: str) -> bool:
-        return all(needle in voice.get("haystack", "") for needle in needles if needle)
+    by_id, by_tag = _voice_index()
+    if voice_id and voice_id in by_id:
+        return voice_id
 
     if voice_pref:
-        pref = voice_pref.lower()
-        matched = _match_voice(lambda v: haystack_contains(v, pref))
+        matched = _match_voice(voice_pref.lower())
         if matched:
             return matched
 
     normalized_choice = (engine_choice or "").lower().strip()
 
     if normalized_choice == "whisper":
-        matched = _match_voice(lambda v: haystack_contains(v, "whisper"))
-        if matched:
-            return matched
+        candidates = list(by_tag["whisper"])
     elif normalized_choice in {"espeak_mbrola", "mbrola", "espeak-mbrola"}:
-        matched = _match_voice(lambda v: haystack_contains(v, "mb", "sv"))
-        if matched:
-            return matched
-        matched = _match_voice(lambda v: haystack_contains(v, "mb"))
-        if matched:
-            return matched
+        candidates = _tagged_ids("mb", "sv") or list(by_tag["mb"])
     elif normalized_choice:
-        matched = _match_voice(lambda v: haystack_contains(v, normalized_choice))
-        if matched:
-            return matched
-
-    if voice_pref:
-        matched = _match_voice(lambda v: haystack_contains(v, voice_pref.lower()))
-        if matched:
-            return matched
-
-    matched = _match_voice(lambda v: haystack_contains(v, "sv"))
-    if matched:
-        return matched
+        matched = _match_voice(normalized_choice)
+        candidates = [matched] if matched else []
+    else:
+        candidates = []
+    if candidates:
+        return candidates[0]
 
-    matched = _match_voice(lambda v: haystack_contains(v, "swedish"))
-    if matched:
-        return matched
+    for tag in ("sv", "swedish"):
+        if by_tag[tag]:
+            return by_tag[tag][0]
 
-    return voices[0]["id"] if voices else None
+    return next(iter(by_id), None)
 
 
 def _available_tts_options() -> List[dict]:
-    voices = _pyttsx3_voice_catalog()
-
-    def list_ids(predicate) -> List[str]:
-        return [voice["id"] for voice in voices if predicate(voice)]
+    _, by_tag = _voice_index()
 
-    whisper_ids = list_ids(lambda v: "whisper" in v.get("haystack", ""))
-    mbrola_ids = list_ids(lambda v: "mb" in v.get("haystack", ""))
-    swedish_mbrola_ids = list_ids(lambda v: "mb" in v.get("haystack", "") and ("sv" in v.get("haystack", "") or "swedish" in v.get("haystack", "")))
+    whisper_ids = list(by_tag["whisper"])
+    mbrola_ids = list(by_tag["mb"])
+    swedish = frozenset(by_tag["sv"] + by_tag["swedish"])
+    swedish_mbrola_ids = [voice_id for voice_id in mbrola_ids if voice_id in swedish]
 
     return [
         {
@@ -566,21 +1097,70 @@ def _available_tts_options() -> List[dict]:
     ]
 
 
+_default_voice_id: Optional[str] = None
+
+
+def _warmup_tts_voices() -> None:
+    global _default_voice_id
+    _espeak_voice_catalog()
+    _default_voice_id = _select_voice_id(DEFAULT_TTS_ENGINE, DEFAULT_TTS_VOICE_HINT, None)
+
+
+@app.on_event("startup")
+async def _preload_tts_voices() -> None:
+    try:
+        await asyncio.to_thread(_warmup_tts_voices)
+    except Exception as exc:
+        logger.warning("Kunde inte läsa in TTS-röster: %s", exc)
+
+
 @app.get("/api/tts/options")
-async def tts_options():
-    voices = _pyttsx3_voice_catalog()
-    fallback_voice = _select_voice_id(DEFAULT_TTS_ENGINE, DEFAULT_TTS_VOICE_HINT, None)
-    return {
+async def tts_options(request: Request):
+    voices = _espeak_voice_catalog()
+    fallback_voice = _default_voice_id or _select_voice_id(DEFAULT_TTS_ENGINE, DEFAULT_TTS_VOICE_HINT, None)
+    return _etag_response(request, {
         "default_engine": DEFAULT_TTS_ENGINE,
         "options": _available_tts_options(),
         "fallback_voice": fallback_voice,
         "total_voices": len(voices),
-    }
+    })
+
+
+def _fix_wav_sizes(audio: bytes) -> bytes:
+    # espeak-ng kan inte spola tillbaka i en pipe, så storleksfälten i WAV-huvudet
+    # blir platshållare. Hela ljudet finns här, så de rättas i efterhand.
+    if len(audio) < 44 or audio[:4] != b"RIFF" or audio[36:40] != b"data":
+        return audio
+    fixed = bytearray(audio)
+    fixed[4:8] = (len(audio) - 8).to_bytes(4, "little")
+    fixed[40:44] = (len(audio) - 44).to_bytes(4, "little")
+    return bytes(fixed)
+
+
+async def _synthesize_speech(text: str, rate: int, voice: Optional[str]) -> bytes:
+    # espeak-ng läser texten från stdin och skriver WAV till stdout – ingen temporär fil.
+    # --stdin läser hela texten på en gång; utan flaggan läser espeak-ng rad för rad i
+    # bitar om 1000 byte (kan klyva ord och å/ä/ö) och skriver radbrytningar till stdout.
+    args = [ESPEAK_BINARY, "--stdin", "-s", str(rate)]
+    if voice:
+        args += ["-v", voice]
+    args.append("--stdout")
+    proc = await asyncio.create_subprocess_exec(
+        *args,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    audio, stderr = await proc.communicate(text.encode("utf-8"))
+    if proc.returncode != 0 or not audio:
+        message = stderr.decode("utf-8", errors="replace").strip()
+        raise RuntimeError(message or "Ingen ljudfil genererades av talsyntesen.")
+    return _fix_wav_sizes(audio)
 
 
 @app.post("/api/tts")
 async def tts(payload: dict):
-    """Text -> WAV (offline TTS via pyttsx3/eSpeak NG)."""
+    """Text -> WAV (offline TTS via eSpeak NG)."""
 
     text = (payload.get("text") or "").strip()
     if not text:
@@ -594,38 +1174,25 @@ async def tts(payload: dict):
     engine_choice = (payload.get("engine") or DEFAULT_TTS_ENGINE).strip().lower()
     voice_pref = (payload.get("voice") or DEFAULT_TTS_VOICE_HINT or "").strip()
     voice_id = payload.get("voice_id")
+    if not isinstance(voice_id, str) or not voice_id:
+        voice_id = None
 
     try:
-        with tempfile.TemporaryDirectory() as td:
-            out_wav = os.path.join(td, "speech.wav")
-            engine = pyttsx3.init()
-            try:
-                engine.setProperty("rate", rate)
-            except Exception:
-                pass
-
-            selected_voice = _select_voice_id(engine_choice, voice_pref or None, voice_id)
-            if selected_voice:
-                try:
-                    engine.setProperty("voice", selected_voice)
-                except Exception:
-                    pass
-
-            engine.save_to_file(text, out_wav)
-            engine.runAndWait()
-
-            if not os.path.exists(out_wav):
-                raise RuntimeError("Ingen ljudfil genererades av talsyntesen.")
-
-            return FileResponse(out_wav, media_type="audio/wav", filename="tts_sv.wav")
+        selected_voice = _select_voice_id(engine_choice, voice_pref or None, voice_id)
+        audio = await _synthesize_speech(text, rate, selected_voice)
+        return Response(
+            content=audio,
+            media_type="audio/wav",
+            headers={"Content-Disposition": 'attachment; filename="tts_sv.wav"'},
+        )
     except HTTPException:
         raise
     except Exception as exc:
         message = str(exc)
-        if isinstance(exc, OSError) and "libespeak" in message.lower():
+        if isinstance(exc, FileNotFoundError):
             hint = (
-                "TTS kräver eSpeak NG-biblioteket. Installera paketet `espeak-ng` "
-                "(som innehåller libespeak-ng1) och försök igen."
+                "TTS kräver eSpeak NG. Installera paketet `espeak-ng` "
+                "och försök igen."
             )
             raise HTTPException(status_code=500, detail=hint) from exc
 
@@ -0,0 +1,72 @@
+"""PDF-extrahering som körs i processpoolen i app.main.
+
+Modulen har inga sidoeffekter vid import (ingen konfiguration, inga klienter eller
+RAG-lager), så att arbetarprocesserna bara laddar det som behövs för PDFium.
+"""
+
+import io
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import pypdfium2 as pdfium
+
+
+def _extract_pdf_page_text(pdf: "pdfium.PdfDocument", index: int) -> str:
+    page = pdf[index]
+    textpage = None
+    try:
+        textpage = page.get_textpage()
+        page_text = textpage.get_text_range() or ""
+    except Exception:
+        page_text = ""
+    finally:
+        if textpage is not None:
+            textpage.close()
+        page.close()
+    # PDFium returnerar CRLF-radbrytningar
+    return page_text.replace("\r\n", "\n").strip()
+
+
+def _read_pdf_pages(pdf: "pdfium.PdfDocument", start: int, stop: int, char_limit: Optional[int]) -> List[str]:
+    texts: List[str] = []
+    total = 0
+    for idx in range(start, stop):
+        page_text = _extract_pdf_page_text(pdf, idx)
+        texts.append(page_text)
+        total += len(page_text)
+        # Fler sidor behövs inte när intervallet ensamt redan passerat gränsen
+        if char_limit is not None and total > char_limit:
+            break
+    return texts
+
+
+def extract_small_pdf(job: Tuple[bytes, int, Optional[int], Optional[int]]) -> Tuple[int, Optional[List[str]]]:
+    """Räknar sidorna och läser dem direkt om dokumentet är för litet för att delas upp.
+
+    Returnerar (antal sidor, sidtexter) eller (antal sidor, None) när dokumentet har minst
+    split_pages sidor (None = dela aldrig) och i stället ska extraheras parallellt.
+    """
+
+    import pypdfium2 as pdfium
+
+    data, max_pages, char_limit, split_pages = job
+    pdf = pdfium.PdfDocument(io.BytesIO(data))
+    try:
+        total_pages = len(pdf)
+        use_pages = min(total_pages, max_pages)
+        if split_pages is not None and use_pages >= split_pages:
+            return total_pages, None
+        return total_pages, _read_pdf_pages(pdf, 0, use_pages, char_limit)
+    finally:
+        pdf.close()
+
+
+def extract_pdf_page_range(job: Tuple[bytes, int, int, Optional[int]]) -> List[str]:
+    import pypdfium2 as pdfium
+
+    data, start, stop, char_limit = job
+    pdf = pdfium.PdfDocument(io.BytesIO(data))
+    try:
+        return _read_pdf_pages(pdf, start, stop, char_limit)
+    finally:
+        pdf.close()
@@ -0,0 +1,71 @@
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+import numpy as np
+import orjson
+
+
+@dataclass
+class _CacheEntry:
+    context_key: str
+    vector: np.ndarray
+    response: str
+    created_at: float
+
+
+class SemanticCache:
+    """Small in-process cache of chat answers keyed by prompt similarity.
+
+    An entry is reused only when everything except the final user prompt is
+    identical (model, options and earlier messages) and the prompt embeddings
+    reach ``threshold`` cosine similarity. Entries expire after ``ttl`` seconds
+    and the least recently used entry is evicted when the cache is full.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 3600.0, threshold: float = 0.95) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl)
+        self.threshold = float(threshold)
+        self._entries: "OrderedDict[int, _CacheEntry]" = OrderedDict()
+        self._next_id = 0
+
+    @staticmethod
+    def context_key(model: str, options: Any, history: List[Any]) -> str:
+        """Hash the parts of a chat request that must match exactly for a cache hit."""
+        payload = orjson.dumps([model, options, history], option=orjson.OPT_SORT_KEYS)
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+    def lookup(self, context_key: str, vector: np.ndarray) -> Optional[str]:
+        """Return the cached answer for the most similar prompt, if it is similar enough."""
+        self._expire()
+        candidates = [(entry_id, entry) for entry_id, entry in self._entries.items() if entry.context_key == context_key]
+        if not candidates:
+            return None
+        matrix = np.stack([entry.vector for _, entry in candidates])
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        if float(scores[best]) < self.threshold:
+            return None
+        entry_id, entry = candidates[best]
+        self._entries.move_to_end(entry_id)
+        return entry.response
+
+    def store(self, context_key: str, vector: np.ndarray, response: str) -> None:
+        if not response:
+            return
+        self._entries[self._next_id] = _CacheEntry(context_key, vector, response, time.monotonic())
+        self._next_id += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.ttl
+        expired = [entry_id for entry_id, entry in self._entries.items() if entry.created_at < cutoff]
+        for entry_id in expired:
+            del self._entries[entry_id]
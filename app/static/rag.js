@@ -242,7 +242,10 @@ async function addUrlDoc() {
       throw new Error(data.detail || ('HTTP ' + res.status));
     }
     input.value = '';
-    await fetchRagDocs({ text: 'Webbsidan lades till i kunskapsbasen.', type: 'success' });
+    const urlMessage = data.deduplicated
+      ? 'Webbsidan finns redan i kunskapsbasen.'
+      : 'Webbsidan lades till i kunskapsbasen.';
+    await fetchRagDocs({ text: urlMessage, type: 'success' });
   } catch (e) {
     setRagStatus('Kunde inte lägga till webbsidan: ' + e.message, 'error');
   } finally {
@@ -272,7 +275,10 @@ async function uploadPdf(event) {
       throw new Error(data.detail || ('HTTP ' + res.status));
     }
     input.value = '';
-    await fetchRagDocs({ text: 'PDF-filen lades till i kunskapsbasen.', type: 'success' });
+    const pdfMessage = data.deduplicated
+      ? 'PDF-filen finns redan i kunskapsbasen.'
+      : 'PDF-filen lades till i kunskapsbasen.';
+    await fetchRagDocs({ text: pdfMessage, type: 'success' });
   } catch (e) {
     setRagStatus('Kunde inte lägga till PDF: ' + e.message, 'error');
   } finally {
@@ -216,6 +216,54 @@ function addMsg(role, text) {
   div.scrollIntoView({ behavior: 'smooth', block: 'end' });
 }
 
+// Läser NDJSON-strömmen från /api/chat. Första raden innehåller RAG-kontexten,
+// resterande rader är Ollamas delsvar som visas löpande i en tillfällig bubbla.
+async function readChatStream(res) {
+  const wrap = document.getElementById('history');
+  const live = document.createElement('div');
+  live.className = 'msg assistant';
+  wrap.appendChild(live);
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let text = '';
+  let ragContext = null;
+
+  const handleLine = (line) => {
+    if (!line.trim()) return;
+    const data = JSON.parse(line);
+    if (data.error) throw new Error(data.error);
+    if (Array.isArray(data.rag_context)) {
+      ragContext = data.rag_context;
+      return;
+    }
+    const piece = data?.message?.content;
+    if (piece) {
+      text += piece;
+      live.textContent = text;
+      live.scrollIntoView({ behavior: 'smooth', block: 'end' });
+    }
+  };
+
+  try {
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let newline;
+      while ((newline = buffer.indexOf('\n')) >= 0) {
+        handleLine(buffer.slice(0, newline));
+        buffer = buffer.slice(newline + 1);
+      }
+    }
+    handleLine(buffer + decoder.decode());
+  } finally {
+    live.remove();
+  }
+  return { text: text.trim(), ragContext };
+}
+
 async function sendPrompt() {
   const ta = document.getElementById('prompt');
   const temperature = parseFloat(document.getElementById('temperature').value);
@@ -260,11 +308,10 @@ async function sendPrompt() {
       const err = await res.json().catch(() => ({}));
       throw new Error(err.detail || ('HTTP ' + res.status));
     }
-    const data = await res.json();
-    const text = data?.message?.content || '[Inget svar]';
-    addMsg('assistant', text);
-    if (useRag || Array.isArray(data?.rag_context)) {
-      renderRagResults(data?.rag_context || []);
+    const { text, ragContext } = await readChatStream(res);
+    addMsg('assistant', text || '[Inget svar]');
+    if (useRag || Array.isArray(ragContext)) {
+      renderRagResults(ragContext || []);
     } else {
       renderRagResults([]);
     }
@@ -366,8 +413,8 @@ async function sendAudioForTranscription() {
   form.append('audio', blob, 'speech.webm');
   try {
     const res = await fetch('/api/transcribe', { method: 'POST', body: form });
-    if (!res.ok) throw new Error('HTTP ' + res.status);
-    const data = await res.json();
+    const data = await res.json().catch(() => ({}));
+    if (!res.ok) throw new Error(data.detail || ('HTTP ' + res.status));
     const text = data.text || '';
     if (text) {
       const ta = document.getElementById('prompt');
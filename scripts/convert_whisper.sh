@@ -0,0 +1,33 @@
+#!/usr/bin/env bash
+set -euo pipefail
+
+# Konverterar en Whisper-modell från Hugging Face till ett lokalt,
+# int8-kvantiserat CTranslate2-format för faster-whisper.
+#
+# Användning:
+#   bash scripts/convert_whisper.sh [modell] [utkatalog]
+#   bash scripts/convert_whisper.sh base models/whisper-base-int8
+#
+# Peka sedan WHISPER_MODEL i .env på utkatalogen.
+# Obs: CTranslate2 saknar int4 för Whisper – int8 är den minsta vikttypen.
+
+MODEL="${1:-tiny}"
+OUT_DIR="${2:-models/whisper-${MODEL}-int8}"
+
+if ! command -v ct2-transformers-converter >/dev/null 2>&1; then
+  echo "Installerar konverteringsverktyg (transformers + torch) i aktuell miljö…"
+  pip install "ctranslate2" "transformers[torch]"
+fi
+
+mkdir -p "$(dirname "$OUT_DIR")"
+
+ct2-transformers-converter \
+  --model "openai/whisper-${MODEL}" \
+  --output_dir "$OUT_DIR" \
+  --copy_files tokenizer.json preprocessor_config.json \
+  --quantization int8 \
+  --force
+
+echo
+echo "Klart: $OUT_DIR"
+echo "Lägg till i .env:  WHISPER_MODEL=$(cd "$OUT_DIR" && pwd)"
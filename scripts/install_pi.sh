@@ -31,4 +31,4 @@ fi
 echo "Tips: Hämta en liten modell först (går snabbare och funkar på Pi):"
 echo "  ollama pull llama3.2:1b"
 echo
-echo "Starta appen med: python -m app.main"
+echo "Starta appen med: python -m app"